@@ -1,40 +1,1319 @@
 import os
-import subprocess
 import sys
 import re
+import time
+import contextlib
+import functools
 import platform # Added for OS detection
-from prompt_toolkit import prompt
-from prompt_toolkit.completion import WordCompleter
-from prompt_toolkit.history import InMemoryHistory
-from prompt_toolkit.key_binding import KeyBindings
-from prompt_toolkit.keys import Keys
-
-def get_current_aliases():
-    """Reads ~/.bash_aliases and returns a list of alias/function names."""
-    alias_file_path = os.path.expanduser("~/.bash_aliases")
-    aliases = []
+try:
+    import fcntl
+except ImportError: # Not available on Windows; writes stay atomic but are not locked
+    fcntl = None
+# prompt_toolkit, argparse, subprocess and tempfile are imported where they are first needed,
+# so list/query subcommands run from shell init scripts don't pay for the interactive UI.
+
+# Import-time budget (in milliseconds) for `python -X importtime -c "import alias_manager"`
+STARTUP_BUDGET_MS = 50
+
+# Hot-path timing: span name -> [calls, seconds], or None while profiling is off
+_span_totals = None
+_NULL_SPAN = contextlib.nullcontext()
+
+class _TimedSpan:
+    """Adds the wall time of a with-block to the totals of a named span."""
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        totals = _span_totals.setdefault(self.name, [0, 0.0])
+        totals[0] += 1
+        totals[1] += time.perf_counter() - self.start
+
+def span(name):
+    """Returns a context manager timing its block under name, or a shared no-op while profiling is off."""
+    return _NULL_SPAN if _span_totals is None else _TimedSpan(name)
+
+def span_iter(name, iterable):
+    """
+    Returns iterable, timing only the work of producing its items under the span name (one call per
+    iteration) while profiling is on, so a streaming consumer's own time isn't counted.
+    """
+    if _span_totals is None:
+        return iterable
+
+    def timed_items():
+        totals = _span_totals.setdefault(name, [0, 0.0])
+        totals[0] += 1
+        iterator = iter(iterable)
+        done = object()
+        while True:
+            start = time.perf_counter()
+            item = next(iterator, done)
+            totals[1] += time.perf_counter() - start
+            if item is done:
+                return
+            yield item
+    return timed_items()
+
+def timed(name):
+    """Decorator recording every call of the function under the span name while profiling is on."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _span_totals is None:
+                return func(*args, **kwargs)
+            with _TimedSpan(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def format_span_summary(title, totals, elapsed):
+    """Returns a table of span calls and times (spans nest, so their times are inclusive)."""
+    rows = [f"--- profile: {title} ({elapsed * 1000:.1f} ms) ---",
+            f"{'span':<18} {'calls':>7} {'total ms':>10} {'mean ms':>9}"]
+    for name, (calls, seconds) in sorted(totals.items(), key=lambda item: -item[1][1]):
+        rows.append(f"{name:<18} {calls:>7} {seconds * 1000:>10.2f} {seconds * 1000 / calls:>9.3f}")
+    return "\n".join(rows) + "\n"
+
+def profiled_operation(func):
+    """Decorator reporting the spans recorded during each call of a menu operation while profiling is on."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _span_totals is None:
+            return func(*args, **kwargs)
+        before = {name: list(totals) for name, totals in _span_totals.items()}
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            totals = {name: [calls - before.get(name, [0, 0.0])[0], seconds - before.get(name, [0, 0.0])[1]]
+                      for name, (calls, seconds) in _span_totals.items()
+                      if calls != before.get(name, [0, 0.0])[0]}
+            sys.stderr.write(format_span_summary(func.__name__, totals, time.perf_counter() - start))
+    return wrapper
+
+def enable_profiling(pstats_path=None):
+    """
+    Turns on span timing and prints a summary of every span when the process exits.
+    With pstats_path, the whole run is also profiled with cProfile and saved there for pstats.
+    """
+    import atexit
+    global _span_totals
+    if _span_totals is not None:
+        return
+    _span_totals = {}
+    start = time.perf_counter()
+    profiler = None
+    if pstats_path:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    def report():
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(pstats_path)
+        sys.stderr.write(format_span_summary("total", _span_totals, time.perf_counter() - start))
+        if profiler is not None:
+            sys.stderr.write(f"cProfile stats written to {pstats_path} (read them with python -m pstats)\n")
+
+    atexit.register(report)
+
+ALIAS_PATTERN = re.compile(r"^\s*alias\s+([a-zA-Z0-9_]+)=")
+FUNCTION_PATTERN = re.compile(r"^\s*([a-zA-Z0-9_]+)\s*\(\)\s*\{")
+
+# Words after which bash still expects a command, so a following { or } is a group delimiter
+COMMAND_KEYWORDS = {"if", "then", "else", "elif", "do", "while", "until", "!", "time", "{", "}"}
+
+def read_heredoc_delimiter(text, i):
+    """
+    Reads the here-document operator starting at text[i] ("<<" or "<<-" and its delimiter word).
+    Returns (delimiter with quoting removed, strip leading tabs, index after the word).
+    """
+    i += 2
+    strip_tabs = i < len(text) and text[i] == "-"
+    if strip_tabs:
+        i += 1
+    while i < len(text) and text[i] in " \t":
+        i += 1
+    word = []
+    quote = None
+    while i < len(text):
+        c = text[i]
+        if quote:
+            if c == quote:
+                quote = None
+            else:
+                word.append(c)
+        elif c in "'\"":
+            quote = c
+        elif c == "\\" and i + 1 < len(text):
+            i += 1
+            word.append(text[i])
+        elif c in " \t\n;&|()<>":
+            break
+        else:
+            word.append(c)
+        i += 1
+    return "".join(word), strip_tabs, i
+
+def scan_brace_depth(text, depth=0, quote=None):
+    """
+    Scans text and returns the updated (depth, quote) state.
+    Only { and } that bash treats as group delimiters are counted: those in command position
+    and standing as their own word, outside quotes, comments and here-document bodies. This keeps
+    ${var}, "}", $'}' and `echo }` from being mistaken for the end of a function.
+    quote is None, the open quote ("'", '"' or "$'"), or a tuple of the (delimiter, strip tabs)
+    pairs of here-documents whose bodies start on the next line.
+    """
+    command_position = True
+    word = None
+    heredocs = [] # Here-documents opened on the current line
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if isinstance(quote, tuple):
+            # Inside here-document bodies, which are read a whole line at a time
+            newline_index = text.find("\n", i)
+            line_end = len(text) if newline_index == -1 else newline_index
+            line = text[i:line_end]
+            delimiter, strip_tabs = quote[0]
+            if (line.lstrip("\t") if strip_tabs else line) == delimiter:
+                quote = quote[1:] or None
+            i = line_end + 1
+            continue
+        if quote == "'":
+            if c == "'":
+                quote = None
+        elif quote in ('"', "$'"):
+            if c == "\\":
+                i += 1
+            elif c == quote[-1]:
+                quote = None
+        elif c in " \t\n":
+            if word is not None:
+                command_position = word in COMMAND_KEYWORDS
+                word = None
+            if c == "\n":
+                command_position = True
+                if heredocs:
+                    quote = tuple(heredocs)
+                    heredocs = []
+        elif c in ";&|()":
+            word = None
+            command_position = True
+        elif word is None and c == "#":
+            newline_index = text.find("\n", i)
+            if newline_index == -1:
+                break
+            i = newline_index
+            continue
+        elif (word is None and command_position and c in "{}"
+              and (i + 1 == len(text) or text[i + 1] in (" \t\n" if c == "{" else " \t\n;&|)"))):
+            depth += 1 if c == "{" else -1
+            word = c
+        elif c == "<" and text.startswith("<<", i) and not text.startswith("<<<", i):
+            line_start = text.rfind("\n", 0, i) + 1
+            if text.count("((", line_start, i) > text.count("))", line_start, i):
+                i += 2 # A shift inside $(( )), not a here-document
+                continue
+            delimiter, strip_tabs, i = read_heredoc_delimiter(text, i)
+            heredocs.append((delimiter, strip_tabs))
+            word = ""
+            continue
+        else:
+            word = (word or "") + c
+            if c == "\\":
+                i += 1
+            elif c == "$" and text.startswith("'", i + 1):
+                quote = "$'"
+                i += 1
+            elif c in "'\"":
+                quote = c
+        i += 1
+    return depth, quote
+
+def iter_alias_entries(lines):
+    """
+    Parses alias file lines from any iterable (a list or an open file), yielding each
+    (entry, span lines) pair as soon as the definition ends. Entries are dicts with name,
+    kind, start, end and body, where start/end are inclusive line numbers.
+    """
+    pending = None # (entry, span lines, header match end) of a function still being read
+    depth = 0
+    quote = None
+    for i, line in enumerate(lines):
+        if pending is not None:
+            # Follow brace depth so nested groups and one-line `name() { cmd; }` functions end correctly
+            pending[1].append(line)
+            depth, quote = scan_brace_depth(line, depth, quote)
+        else:
+            stripped_line = line.strip()
+            alias_match = ALIAS_PATTERN.match(stripped_line)
+            if alias_match:
+                yield ({"name": alias_match.group(1), "kind": "alias", "start": i, "end": i,
+                        "body": stripped_line[alias_match.end():]}, [line])
+                continue
+            function_match = FUNCTION_PATTERN.match(stripped_line)
+            if not function_match:
+                continue
+            pending = ({"name": function_match.group(1), "kind": "function", "start": i},
+                       [line], function_match.end())
+            depth, quote = scan_brace_depth(line)
+        if depth <= 0 and not quote:
+            entry, span_lines, header_end = pending
+            entry["end"] = i
+            entry["body"] = function_body(span_lines, header_end)
+            pending = None
+            yield entry, span_lines
+    if pending is not None: # Unterminated function runs to the end of the file
+        entry, span_lines, header_end = pending
+        entry["end"] = entry["start"] + len(span_lines) - 1
+        entry["body"] = function_body(span_lines, header_end, closed=False)
+        entry["unterminated"] = True
+        yield entry, span_lines
+
+@timed("parse")
+def parse_alias_lines(lines):
+    """
+    Parses the lines of an alias file in a single pass.
+    Returns the list of entries and a mapping of name -> entry positions.
+    """
+    entries = []
+    names = {}
+    for entry, _ in iter_alias_entries(lines):
+        names.setdefault(entry["name"], []).append(len(entries))
+        entries.append(entry)
+    return entries, names
+
+def function_body(span_lines, header_end, closed=True):
+    """Returns the commands between a function's opening and closing braces."""
+    text = "".join(span_lines).strip()[header_end:]
+    if closed:
+        text = text[:text.rfind("}")]
+    return text.strip().rstrip(";").rstrip()
+
+def stream_alias_entries(sources, prefix=None, offset=0, limit=None):
+    """
+    Yields (path, entry, span lines) straight from each alias file in turn without loading them
+    into memory, keeping names that start with prefix and skipping/capping matches with offset/limit.
+    """
+    import itertools
+
+    def iter_all_sources():
+        for path in sources:
+            if not os.path.exists(path):
+                continue
+            with open(path, "r") as f:
+                # Reading and parsing are interleaved here, so both are timed as "parse"
+                for entry, span_lines in span_iter("parse", iter_alias_entries(f)):
+                    if prefix is None or entry["name"].startswith(prefix):
+                        yield path, entry, span_lines
+
+    yield from itertools.islice(iter_all_sources(), offset, None if limit is None else offset + limit)
+
+def build_alias_index(alias_file_path):
+    """Reads the alias file once and returns an index of its lines and parsed entries."""
+    lines = []
     if os.path.exists(alias_file_path):
-        with open(alias_file_path, "r") as f:
-            for line in f:
-                stripped_line = line.strip()
-                alias_match = re.match(r"^\s*alias\s+([a-zA-Z0-9_]+)=", stripped_line)
-                function_match = re.match(r"^\s*([a-zA-Z0-9_]+)\s*\(\)\s*\{", stripped_line)
-                if alias_match:
-                    aliases.append(alias_match.group(1))
-                elif function_match:
-                    aliases.append(function_match.group(1))
-    return sorted(list(set(aliases)))
-
-alias_completer = WordCompleter(get_current_aliases(), ignore_case=True)
-history = InMemoryHistory()
-
-kb = KeyBindings()
-
-@kb.add(Keys.ControlZ)
-def _(event):
-    "Pressing Ctrl-Z will exit the tool."
-    sys.exit(0)
+        with span("read"), open(alias_file_path, "r") as f:
+            lines = f.readlines()
+    entries, names = parse_alias_lines(lines)
+    return {"path": alias_file_path, "lines": lines, "entries": entries, "names": names}
+
+# Parsed indexes keyed on the alias file path; each one remembers the file signature it was read at
+_alias_index_cache = {}
+
+def get_file_signature(alias_file_path):
+    """Returns (st_mtime_ns, st_size, st_ino) for the file, or None if it does not exist."""
+    try:
+        st = os.stat(alias_file_path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+def load_alias_index(alias_file_path):
+    """Returns the parsed index for the alias file, reparsing only if it changed on disk."""
+    signature = get_file_signature(alias_file_path) # Taken before reading so a racing edit forces a reload
+    cached = _alias_index_cache.get(alias_file_path)
+    if cached is not None and cached["signature"] == signature:
+        return cached
+    index = build_alias_index(alias_file_path)
+    index["signature"] = signature
+    _alias_index_cache[alias_file_path] = index
+    return index
+
+def store_alias_index(alias_file_path, lines, entries=None):
+    """
+    Caches the index for lines the tool itself has just written to the alias file.
+    Entries already known for those lines (with matching spans) are used instead of reparsing.
+    """
+    if entries is None:
+        entries, names = parse_alias_lines(lines)
+    else:
+        names = {}
+        for position, entry in enumerate(entries):
+            names.setdefault(entry["name"], []).append(position)
+    index = {"path": alias_file_path, "lines": lines, "entries": entries, "names": names,
+             "signature": get_file_signature(alias_file_path)}
+    _alias_index_cache[alias_file_path] = index
+    return index
+
+@timed("index.update")
+def update_alias_index_after_append(alias_file_path, text, previous_signature):
+    """
+    Updates the cached index in memory after the tool appended text to the alias file.
+    If the file was edited by someone else since it was cached, the entry is dropped instead.
+    """
+    index = _alias_index_cache.get(alias_file_path)
+    if index is None or index["signature"] != previous_signature:
+        _alias_index_cache.pop(alias_file_path, None)
+        return
+    lines = index["lines"]
+    entries = index["entries"]
+
+    # Reparse from the last entry if it may continue into the appended text (an unterminated function)
+    reparse_from = len(lines)
+    if entries and entries[-1]["kind"] == "function" and entries[-1]["end"] == len(lines) - 1:
+        reparse_from = entries[-1]["start"]
+    if lines and not lines[-1].endswith("\n"):
+        reparse_from = min(reparse_from, len(lines) - 1)
+    while entries and entries[-1]["end"] >= reparse_from:
+        dropped = entries.pop()
+        positions = index["names"][dropped["name"]]
+        positions.pop()
+        if not positions:
+            del index["names"][dropped["name"]]
+
+    tail = "".join(lines[reparse_from:]) + text
+    del lines[reparse_from:]
+    new_lines = tail.splitlines(keepends=True)
+    new_entries, _ = parse_alias_lines(new_lines)
+    for entry in new_entries:
+        entry["start"] += reparse_from
+        entry["end"] += reparse_from
+        index["names"].setdefault(entry["name"], []).append(len(entries))
+        entries.append(entry)
+    lines.extend(new_lines)
+    # Cache a new index object, so merged indexes built from the old one see that it changed
+    updated = {key: value for key, value in index.items() if key not in ("sorted_names", "name_index")}
+    updated["signature"] = get_file_signature(alias_file_path)
+    _alias_index_cache[alias_file_path] = updated
+
+# Extra alias files read after the primary one, unless ALIAS_MANAGER_SOURCES (os.pathsep-separated) overrides them
+ALIAS_SOURCE_PATTERNS = ["~/.bash_aliases.d/*.sh"]
+
+def get_alias_sources(alias_file_path=None, patterns=None):
+    """
+    Returns the alias files to read, in the order a shell sources them: the primary alias file
+    first, then the files matching each pattern, sorted. Later definitions override earlier ones.
+    """
+    import glob
+    if patterns is None:
+        configured = os.environ.get("ALIAS_MANAGER_SOURCES")
+        patterns = configured.split(os.pathsep) if configured else ALIAS_SOURCE_PATTERNS
+    sources = [alias_file_path or get_alias_file_path()]
+    seen = {os.path.realpath(sources[0])}
+    for pattern in patterns:
+        for path in sorted(glob.glob(os.path.expanduser(pattern))):
+            if os.path.realpath(path) not in seen and os.path.isfile(path):
+                seen.add(os.path.realpath(path))
+                sources.append(path)
+    return sources
+
+# Merged indexes keyed on the tuple of sources; each one remembers the per-file indexes it was built from
+_merged_index_cache = {}
+
+@timed("index.merge")
+def load_merged_index(sources):
+    """
+    Returns one index over several alias files. Files are loaded in parallel through the per-file
+    cache, so only files that changed are reparsed. The merged index maps each name to the file
+    holding its effective (last) definition, and flags names defined in more than one file.
+    """
+    sources = tuple(sources)
+    if len(sources) == 1:
+        indexes = [load_alias_index(sources[0])]
+    else:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=min(8, len(sources))) as executor:
+            indexes = list(executor.map(load_alias_index, sources))
+
+    cached = _merged_index_cache.get(sources)
+    if cached is not None and all(a is b for a, b in zip(cached["parts"], indexes)):
+        return cached
+
+    owners = {} # Name -> file with the effective definition
+    shadowed = {} # Name -> earlier files whose definitions are overridden
+    for path, index in zip(sources, indexes):
+        for name in index["names"]:
+            if name in owners and owners[name] != path:
+                shadowed.setdefault(name, []).append(owners[name])
+            owners[name] = path
+    merged = {"sources": sources, "parts": indexes, "indexes": dict(zip(sources, indexes)),
+              "owners": owners, "shadowed": shadowed}
+    _merged_index_cache[sources] = merged
+    return merged
+
+def remove_aliases_from_sources(sources, names):
+    """
+    Deletes every definition of names from whichever alias files define them; files that
+    don't define any of the names are not touched. Returns (found names, changed files).
+    """
+    merged = load_merged_index(sources)
+    found_names = set()
+    changed_paths = []
+    for path in merged["sources"]:
+        names_in_file = {name for name in names if name in merged["indexes"][path]["names"]}
+        if names_in_file:
+            removed_names, _ = remove_aliases(path, names_in_file)
+            if removed_names:
+                found_names |= removed_names
+                changed_paths.append(path)
+    return found_names, changed_paths
+
+class UnterminatedDefinitionError(ValueError):
+    """Raised instead of rewriting a function whose closing brace was never found."""
+
+@timed("splice")
+def splice_alias_entries(index, positions, replacements=None, appended_lines=()):
+    """
+    Patches the file's lines using the precomputed spans, in one linear pass: entries at the given
+    positions of index["entries"] are dropped, entries in replacements (position -> new lines) are
+    replaced in place, and appended_lines are added at the end.
+    Returns (new lines, new entries with spans shifted to match); only the new text is parsed.
+    Raises UnterminatedDefinitionError if a dropped or replaced function never closes, since its
+    span runs to the end of the file and would take every later definition with it.
+    """
+    replacements = replacements or {}
+    lines = index["lines"]
+    for position in set(positions) | set(replacements):
+        entry = index["entries"][position]
+        if entry.get("unterminated"):
+            raise UnterminatedDefinitionError(
+                f"{entry['name']}() in {index['path']} (line {entry['start'] + 1}) has no closing brace "
+                f"the parser could find; fix the file by hand before changing it")
+    new_lines = []
+    new_entries = []
+    cursor = 0
+
+    def add_parsed(added_lines):
+        offset = len(new_lines)
+        new_lines.extend(added_lines)
+        for entry in parse_alias_lines(added_lines)[0]:
+            new_entries.append(dict(entry, start=entry["start"] + offset, end=entry["end"] + offset))
+
+    for position, entry in enumerate(index["entries"]):
+        if position in replacements:
+            new_lines.extend(lines[cursor:entry["start"]])
+            add_parsed(replacements[position])
+            cursor = entry["end"] + 1
+        elif position in positions:
+            # Blank separator lines written before the definition go with it
+            keep_until = entry["start"]
+            while keep_until > cursor and not lines[keep_until - 1].strip():
+                keep_until -= 1
+            new_lines.extend(lines[cursor:keep_until])
+            cursor = entry["end"] + 1
+        else:
+            shift = len(new_lines) - cursor # Lines from cursor onwards are copied over unchanged
+            new_entries.append(dict(entry, start=entry["start"] + shift, end=entry["end"] + shift))
+    new_lines.extend(lines[cursor:])
+    if appended_lines:
+        if new_lines and not new_lines[-1].endswith("\n"):
+            new_lines[-1] += "\n"
+        add_parsed(list(appended_lines))
+    return new_lines, new_entries
+
+def compact_alias_sources(sources, dry_run=False):
+    """
+    Removes dead definitions from the alias files in one pass over the merged index: earlier
+    duplicates of a name within a file, and definitions overridden by a later file. Only the
+    effective (last) definition of each name is kept. Each changed file is rewritten atomically.
+    Returns a list of (path, definitions removed, lines saved, bytes saved) for changed files.
+    """
+    report = []
+    for path in sources:
+        with alias_file_lock(path):
+            merged = load_merged_index(sources) # Re-checked under the lock
+            index = merged["indexes"][path]
+            positions = set()
+            for name, name_positions in index["names"].items():
+                if merged["owners"][name] == path:
+                    positions.update(name_positions[:-1]) # Redefined later in this file
+                else:
+                    positions.update(name_positions) # Overridden by a later file
+            if not positions:
+                continue
+            new_lines, new_entries = splice_alias_entries(index, positions)
+            bytes_saved = len("".join(index["lines"]).encode()) - len("".join(new_lines).encode())
+            report.append((path, len(positions), len(index["lines"]) - len(new_lines), bytes_saved))
+            if not dry_run:
+                write_alias_file(path, new_lines, new_entries)
+    return report
+
+# Lock depth per alias file, so nested helpers in this process don't deadlock on their own lock
+_held_locks = {}
+
+@contextlib.contextmanager
+def alias_file_lock(alias_file_path):
+    """
+    Holds an exclusive advisory fcntl lock for the alias file.
+    The lock lives on a sidecar ".lock" file, since os.replace swaps out the alias file's inode.
+    """
+    if fcntl is None or _held_locks.get(alias_file_path):
+        _held_locks[alias_file_path] = _held_locks.get(alias_file_path, 0) + 1
+        try:
+            yield
+        finally:
+            _held_locks[alias_file_path] -= 1
+        return
+    with open(alias_file_path + ".lock", "a") as lock_file:
+        with span("lock.wait"):
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        _held_locks[alias_file_path] = 1
+        try:
+            yield
+        finally:
+            _held_locks[alias_file_path] = 0
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+@timed("write")
+def atomic_write_lines(target_path, lines):
+    """
+    Writes lines to a temp file in the target's directory, fsyncs it and os.replace()s it over the target.
+    A crash at any point leaves either the old file or the new one, never a partial write.
+    """
+    target_path = os.path.realpath(target_path) # Keep symlinked dotfiles pointing at the real file
+    directory = os.path.dirname(target_path)
+    if os.path.exists(target_path):
+        mode = os.stat(target_path).st_mode & 0o7777
+    else:
+        umask = os.umask(0)
+        os.umask(umask)
+        mode = 0o666 & ~umask
+    import tempfile
+    fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(target_path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, target_path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(temp_path)
+        raise
+    with contextlib.suppress(OSError, AttributeError): # Directory fsync is POSIX-only
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+def write_alias_file(alias_file_path, lines, entries=None):
+    """Atomically rewrites the alias file under the lock and caches the index for the new lines."""
+    with alias_file_lock(alias_file_path):
+        atomic_write_lines(alias_file_path, lines)
+        index = store_alias_index(alias_file_path, lines, entries)
+        refresh_compiled_alias_file(alias_file_path)
+        return index
+
+def append_to_alias_file(alias_file_path, text):
+    """Atomically appends text to the alias file under the lock, updating the cached index in memory."""
+    with alias_file_lock(alias_file_path):
+        index = load_alias_index(alias_file_path)
+        previous_signature = index["signature"]
+        atomic_write_lines(alias_file_path, index["lines"] + [text])
+        update_alias_index_after_append(alias_file_path, text, previous_signature)
+        refresh_compiled_alias_file(alias_file_path)
+
+def remove_aliases(alias_file_path, names):
+    """
+    Deletes every definition of names in one locked read-modify-write.
+    The file is re-checked under the lock, so edits made since it was listed are not lost.
+    Returns (names that were found, removed entries).
+    """
+    with alias_file_lock(alias_file_path):
+        index = load_alias_index(alias_file_path)
+        found_names = {name for name in names if name in index["names"]}
+        positions = {position for name in found_names for position in index["names"][name]}
+        removed_entries = [index["entries"][position] for position in sorted(positions)]
+        if found_names:
+            write_alias_file(alias_file_path, *splice_alias_entries(index, positions))
+    return found_names, removed_entries
+
+def definition_lines(definition):
+    """Returns the lines of a definition as written to the alias file, preceded by a blank separator line."""
+    return f"\n{definition.strip(chr(10))}\n".splitlines(keepends=True)
+
+def apply_alias_changes(alias_file_path, additions=(), removals=()):
+    """
+    Applies a batch of changes in one locked read-modify-write of the alias file.
+    additions is a sequence of (name, definition text) pairs with upsert semantics: a name that is
+    already defined has its last definition replaced in place and earlier copies removed, while new
+    names are appended in order. removals is a set of names to delete.
+    Returns (removal names that were found, addition names that replaced an existing definition).
+    """
+    definitions = dict(additions) # The last definition given for a name wins
+    with alias_file_lock(alias_file_path):
+        index = load_alias_index(alias_file_path)
+        found_names = {name for name in removals if name in index["names"] and name not in definitions}
+        positions = {position for name in found_names for position in index["names"][name]}
+        replacements = {}
+        appended_lines = []
+        for name, definition in definitions.items():
+            if name in index["names"]:
+                name_positions = index["names"][name]
+                replacements[name_positions[-1]] = definition_lines(definition)[1:] # Keep the existing spacing
+                positions.update(name_positions[:-1])
+            else:
+                appended_lines.extend(definition_lines(definition))
+        if positions or replacements or appended_lines:
+            write_alias_file(alias_file_path, *splice_alias_entries(index, positions, replacements, appended_lines))
+    return found_names, {name for name in definitions if name in index["names"]}
+
+def upsert_aliases(sources, additions):
+    """
+    Writes (name, definition text) pairs with upsert semantics. A name that already exists is updated
+    in the file holding its effective definition, so the new definition isn't shadowed; new names go
+    to the primary alias file. Returns (names that were replaced, files that changed).
+    """
+    definitions = dict(additions) # The last definition given for a name wins
+    merged = load_merged_index(sources)
+    by_path = {}
+    for name, definition in definitions.items():
+        by_path.setdefault(merged["owners"].get(name, sources[0]), []).append((name, definition))
+    replaced_names = set()
+    for path, path_additions in by_path.items():
+        with alias_file_lock(path):
+            # The merged index was read without the lock, so re-check the names against the file under it
+            index = load_alias_index(path)
+            if path == sources[0] and not any(name in index["names"] or name in merged["owners"]
+                                              for name, _ in path_additions):
+                # Only new names: append, updating the cached index in memory
+                append_to_alias_file(path, "".join("".join(definition_lines(definition)) for _, definition in path_additions))
+            else:
+                replaced_names |= apply_alias_changes(path, additions=path_additions)[1]
+    return replaced_names, list(by_path)
+
+# Function bodies that reference arguments or control the function itself can't become aliases
+ARGUMENT_REFERENCE_PATTERN = re.compile(r"\$(\{)?[0-9@*#]|\b(return|local|shift)\b|<<")
+
+def compiled_alias_path(alias_file_path):
+    """Returns the path of the compiled snippet generated for an alias file."""
+    return alias_file_path + ".compiled"
+
+def is_simple_command(body):
+    """Returns True if a function body is a single command that can be written as an alias."""
+    return bool(body) and "\n" not in body and not ARGUMENT_REFERENCE_PATTERN.search(body)
+
+def compile_alias_lines(lines, entries, names):
+    """
+    Returns the compiled form of a parsed alias file: only the last definition of each name is kept,
+    comment and blank lines are dropped, and single-command functions become `alias` lines
+    (like any alias, these receive the caller's arguments appended to the command).
+    Other shell code is kept verbatim and everything stays in its original order.
+    """
+    compiled_lines = []
+    quote = None # Quote/here-document state of the shell code between definitions
+
+    def add_code(code_lines):
+        nonlocal quote
+        for line in code_lines:
+            # Lines inside a multi-line string or here-document are part of it, even if blank or starting with #
+            stripped_line = line.strip()
+            if quote or (stripped_line and not stripped_line.startswith("#")):
+                compiled_lines.append(line if line.endswith("\n") else line + "\n")
+            _, quote = scan_brace_depth(line, 0, quote)
+
+    cursor = 0
+    for position, entry in enumerate(entries):
+        add_code(lines[cursor:entry["start"]])
+        cursor = entry["end"] + 1
+        if names[entry["name"]][-1] != position:
+            continue # Redefined later in the file
+        if entry["kind"] == "alias":
+            compiled_lines.append(lines[entry["start"]].strip() + "\n")
+        elif is_simple_command(entry["body"]):
+            quoted_body = entry["body"].replace("'", "'\\''")
+            compiled_lines.append(f"alias {entry['name']}='{quoted_body}'\n")
+        else:
+            compiled_lines.append(f"{entry['name']}() {{\n  {entry['body']}\n}}\n")
+    add_code(lines[cursor:])
+    return compiled_lines
+
+class CompiledSyntaxError(ValueError):
+    """Raised when the compiled snippet fails `bash -n`; the previous snippet is left in place."""
+
+@timed("compile")
+def compile_alias_file(alias_file_path, force=False):
+    """
+    Writes the compiled snippet next to the alias file, unless the content hash recorded in the
+    existing snippet shows the source is unchanged. Returns (compiled path, whether it was rewritten).
+    The snippet is checked with `bash -n` first, since every new shell sources it; if it doesn't
+    parse, CompiledSyntaxError is raised and the previous snippet is kept.
+    """
+    import hashlib
+    output_path = compiled_alias_path(alias_file_path)
+    with alias_file_lock(alias_file_path):
+        index = load_alias_index(alias_file_path)
+        digest = hashlib.sha256("".join(index["lines"]).encode()).hexdigest()
+        header = f"# Compiled from {alias_file_path} by alias_manager.py (sha256 {digest}); do not edit.\n"
+        if not force and os.path.exists(output_path):
+            with open(output_path, "r") as f:
+                up_to_date = f.readline() == header
+            if up_to_date:
+                os.utime(output_path) # Keep it newer than the source for the `-nt` check in compiled_source_snippet
+                return output_path, False
+        compiled_lines = compile_alias_lines(index["lines"], index["entries"], index["names"])
+        error = check_shell_syntax("".join(compiled_lines))
+        if error is not None:
+            raise CompiledSyntaxError(f"{output_path} was not updated, the compiled snippet has a syntax error: {error}")
+        atomic_write_lines(output_path, [header] + compiled_lines)
+    return output_path, True
+
+def compiled_source_snippet(alias_file_path):
+    """
+    Returns the ~/.bashrc lines that source the compiled snippet, falling back to the alias file
+    itself when it was edited outside this tool after the snippet was last compiled.
+    """
+    import shlex
+    source = shlex.quote(alias_file_path)
+    compiled = shlex.quote(compiled_alias_path(alias_file_path))
+    return (f"if [ -f {compiled} ] && ! [ {source} -nt {compiled} ]; then\n"
+            f"    . {compiled}\n"
+            f"elif [ -f {source} ]; then\n"
+            f"    . {source}\n"
+            f"fi\n")
+
+def refresh_compiled_alias_file(alias_file_path):
+    """Recompiles the alias file if the user has opted in by compiling it before."""
+    if os.path.exists(compiled_alias_path(alias_file_path)):
+        try:
+            compile_alias_file(alias_file_path)
+        except CompiledSyntaxError as error:
+            print(f"warning: {error}", file=sys.stderr)
+
+# Number of per-change delta files kept for live shells; a shell further behind re-sources everything
+DELTA_KEEP = 100
+
+def snapshot_alias_sources(sources):
+    """
+    Returns what live shells need to know about the alias files: the text of each name's effective
+    definition, and per file the rest of its shell code (exports, options and so on).
+    """
+    merged = load_merged_index(sources)
+    definitions = {}
+    other_code = {}
+    for path, index in merged["indexes"].items():
+        lines = index["lines"]
+        cursor = 0
+        other_lines = []
+        for position, entry in enumerate(index["entries"]):
+            other_lines.extend(line for line in lines[cursor:entry["start"]] if line.strip() and not line.strip().startswith("#"))
+            cursor = entry["end"] + 1
+            if merged["owners"][entry["name"]] == path and index["names"][entry["name"]][-1] == position:
+                definitions[entry["name"]] = "".join(lines[entry["start"]:cursor]).rstrip("\n") + "\n"
+        other_lines.extend(line for line in lines[cursor:] if line.strip() and not line.strip().startswith("#"))
+        other_code[path] = "".join(other_lines)
+    return {"definitions": definitions, "other_code": other_code}
+
+def build_alias_delta(old_snapshot, new_snapshot):
+    """Returns the shell code that brings a shell from old_snapshot to new_snapshot ("" if nothing changed)."""
+    import shlex
+    old_definitions = old_snapshot["definitions"]
+    delta = []
+    for name in old_definitions.keys() - new_snapshot["definitions"].keys():
+        delta.append(f"unalias {name} 2>/dev/null; unset -f {name} 2>/dev/null\n")
+    for name, text in new_snapshot["definitions"].items():
+        if old_definitions.get(name) != text:
+            # Clear the old definition first, in case the name switched between alias and function
+            delta.append(f"unalias {name} 2>/dev/null; unset -f {name} 2>/dev/null\n{text}")
+    for path, code in new_snapshot["other_code"].items():
+        if old_snapshot["other_code"].get(path, "") != code:
+            delta.append(f"[ -r {shlex.quote(path)} ] && . {shlex.quote(path)}\n") # Other shell code changed
+    return "".join(delta)
+
+def write_alias_delta(delta):
+    """Writes delta as the next numbered delta file, publishes its number and prunes old ones."""
+    delta_dir = os.path.dirname(get_state_path(os.path.join("delta", "seq")))
+    os.makedirs(delta_dir, exist_ok=True)
+    seq_path = os.path.join(delta_dir, "seq")
+    try:
+        with open(seq_path, "r") as f:
+            seq = int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        seq = 0
+    seq += 1
+    atomic_write_lines(os.path.join(delta_dir, f"{seq}.sh"), [delta])
+    atomic_write_lines(seq_path, [f"{seq}\n"]) # Published only once the delta file is complete
+    with contextlib.suppress(OSError):
+        os.unlink(os.path.join(delta_dir, f"{seq - DELTA_KEEP}.sh"))
+    return seq
+
+def wait_for_change(directories, timeout):
+    """
+    Blocks until something in directories changes (via inotify on Linux) or timeout seconds pass.
+    Returns False if inotify is unavailable, so the caller falls back to polling.
+    """
+    import select
+    try:
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+    except (OSError, AttributeError):
+        return False
+    if fd < 0:
+        return False
+    try:
+        # IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+        mask = 0x2 | 0x8 | 0x40 | 0x80 | 0x100 | 0x200
+        watches = [libc.inotify_add_watch(fd, directory.encode(), mask) for directory in directories]
+        if not any(watch >= 0 for watch in watches):
+            return False
+        if select.select([fd], [], [], timeout)[0]:
+            with contextlib.suppress(BlockingIOError):
+                os.read(fd, 65536)
+        return True
+    finally:
+        os.close(fd)
+
+def watch_alias_sources(alias_file_path=None, patterns=None, poll_interval=2.0):
+    """
+    Watches the alias files and writes a delta file for every change, until interrupted.
+    Uses inotify where available and falls back to polling the files' signatures.
+    """
+    sources = get_alias_sources(alias_file_path, patterns)
+    snapshot = snapshot_alias_sources(sources)
+    signatures = [get_file_signature(path) for path in sources]
+    while True:
+        directories = {os.path.dirname(os.path.realpath(path)) for path in sources}
+        directories.update(os.path.expanduser(os.path.dirname(pattern))
+                           for pattern in (patterns or ALIAS_SOURCE_PATTERNS) if os.path.isdir(os.path.expanduser(os.path.dirname(pattern))))
+        if not wait_for_change(sorted(directories), poll_interval):
+            time.sleep(poll_interval)
+        time.sleep(0.05) # Let a burst of writes settle
+        sources = get_alias_sources(alias_file_path, patterns) # Picks up added and removed files
+        new_signatures = [get_file_signature(path) for path in sources]
+        if new_signatures == signatures:
+            continue
+        signatures = new_signatures
+        for path in sources:
+            refresh_compiled_alias_file(path) # Outside edits reach the compiled snippet too
+        new_snapshot = snapshot_alias_sources(sources)
+        delta = build_alias_delta(snapshot, new_snapshot)
+        snapshot = new_snapshot
+        if delta:
+            seq = write_alias_delta(delta)
+            print(f"Wrote delta {seq}: {delta.count(chr(10))} line(s)", flush=True)
+
+def shell_hook_snippet(sources):
+    """Returns the bash/zsh code that sources pending delta files before each prompt."""
+    import shlex
+    delta_dir = os.path.join(os.path.expanduser(STATE_DIR), "delta")
+    full_reload = "; ".join(f"[ -r {shlex.quote(path)} ] && . {shlex.quote(path)}" for path in sources)
+    return f"""# alias_manager.py live reload: applies alias changes before each prompt
+__alias_manager_delta_dir={shlex.quote(delta_dir)}
+read -r __alias_manager_seq 2>/dev/null < "$__alias_manager_delta_dir/seq" || __alias_manager_seq=0
+__alias_manager_reload() {{
+  local seq i
+  read -r seq 2>/dev/null < "$__alias_manager_delta_dir/seq" || return 0
+  [ "$seq" = "$__alias_manager_seq" ] && return 0
+  i=$((__alias_manager_seq + 1))
+  while [ "$i" -le "$seq" ]; do
+    if [ -r "$__alias_manager_delta_dir/$i.sh" ]; then
+      . "$__alias_manager_delta_dir/$i.sh"
+    else
+      {full_reload}
+      break
+    fi
+    i=$((i + 1))
+  done
+  __alias_manager_seq=$seq
+}}
+if [ -n "${{ZSH_VERSION:-}}" ]; then
+  precmd_functions+=(__alias_manager_reload)
+else
+  case ";${{PROMPT_COMMAND:-}};" in
+    *";__alias_manager_reload;"*) ;;
+    *) PROMPT_COMMAND="__alias_manager_reload${{PROMPT_COMMAND:+;$PROMPT_COMMAND}}" ;;
+  esac
+fi
+"""
+
+# Limits for `bash -n` syntax checks of new definitions
+VALIDATION_TIMEOUT = 10 # Seconds per bash process
+VALIDATION_BATCH_SIZE = 200 # Definitions checked by one bash process
+
+@timed("validate.bash")
+def check_shell_syntax(text, timeout=VALIDATION_TIMEOUT):
+    """Runs `bash -n` on text and returns bash's error message, or None if it parses (or bash is missing)."""
+    import subprocess
+    try:
+        result = subprocess.run(["bash", "-n"], input=text, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return f"bash -n timed out after {timeout} seconds"
+    except FileNotFoundError: # No bash to check with (e.g. Windows); nothing can be reported
+        return None
+    if result.returncode == 0:
+        return None
+    message = result.stderr.strip().splitlines()
+    return message[0].replace("bash: ", "", 1) if message else f"bash -n exited with status {result.returncode}"
+
+@timed("validate")
+def validate_definitions(definitions, timeout=VALIDATION_TIMEOUT, batch_size=VALIDATION_BATCH_SIZE):
+    """
+    Checks (name, definition text) pairs with `bash -n` before they are written.
+    Definitions are checked in batches, one bash process per batch, with at most one bash process
+    per CPU running at a time. A batch only passes if bash accepts it and our parser still splits
+    it into the same definitions (so a stray quote can't pair up with the next definition);
+    otherwise its definitions are checked one by one to find the broken ones.
+    Returns {name: error message} for invalid definitions, or None if bash is not installed.
+    """
+    import shutil
+    from concurrent.futures import ThreadPoolExecutor
+    if shutil.which("bash") is None:
+        return None
+    definitions = list(definitions)
+
+    def check_batch(batch):
+        text = "".join(f"{definition.strip(chr(10))}\n" for _, definition in batch)
+        if check_shell_syntax(text, timeout) is None:
+            parsed_names = [entry["name"] for entry, _ in iter_alias_entries(text.splitlines(keepends=True))]
+            if parsed_names == [name for name, _ in batch]:
+                return {}
+        if len(batch) == 1:
+            name, definition = batch[0]
+            return {name: check_shell_syntax(definition, timeout) or "definition does not parse as a single alias or function"}
+        return {name: error for name, definition in batch
+                for error in [check_shell_syntax(definition, timeout)] if error}
+
+    batches = [definitions[i:i + batch_size] for i in range(0, len(definitions), batch_size)]
+    errors = {}
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as executor: # Each worker drives one bash process
+        for batch_errors in executor.map(check_batch, batches):
+            errors.update(batch_errors)
+    return errors
+
+def get_current_aliases(alias_file_path=None):
+    """
+    Returns the sorted alias/function names defined in one alias file (default: the primary alias file,
+    see get_alias_file_path). Use load_merged_index for the names across all configured sources.
+    """
+    if alias_file_path is None:
+        alias_file_path = get_alias_file_path()
+    index = load_alias_index(alias_file_path)
+    if "sorted_names" not in index:
+        index["sorted_names"] = sorted(index["names"])
+    return index["sorted_names"]
+
+class AliasNameIndex:
+    """
+    Case-insensitive sorted index of alias names. Prefix lookups are two bisections, and
+    fuzzy (subsequence) lookups scan the names sharing the query's first character in chunks,
+    starting where the longest matching prefix of the query sorts.
+    """
+
+    # Upper bounds on candidates considered per keystroke, so latency doesn't grow with the file
+    MAX_PREFIX_CANDIDATES = 500
+    MAX_FUZZY_CANDIDATES = 200
+    FUZZY_CHUNK_SIZE = 2000 # Names per regex scan
+    FUZZY_TIME_BUDGET = 0.004 # Seconds of fuzzy scanning per lookup; only reached on huge single-letter buckets
+
+    def __init__(self, names):
+        self.names = sorted(names, key=str.lower)
+        self.name_set = set(self.names)
+        self.keys = [name.lower() for name in self.names]
+        self._chunks = {} # First character -> list of ("\n"-prefixed joined keys, offset in self.names)
+
+    def prefix_range(self, prefix):
+        """Returns the (start, end) slice of names starting with prefix."""
+        import bisect
+        prefix = prefix.lower()
+        start = bisect.bisect_left(self.keys, prefix)
+        end = bisect.bisect_left(self.keys, prefix + "\uffff", start)
+        return start, end
+
+    def fuzzy_matches(self, query):
+        """Yields names that contain the query's characters in order, starting with its first one."""
+        query = query.lower()
+        first = query[0]
+        bucket_start, bucket_end = self.prefix_range(first)
+        if first not in self._chunks:
+            self._chunks[first] = [("\n" + "\n".join(self.keys[start:start + self.FUZZY_CHUNK_SIZE]), start)
+                                   for start in range(bucket_start, bucket_end, self.FUZZY_CHUNK_SIZE)]
+        chunks = self._chunks[first]
+        # Start with the names sharing the longest prefix of the query, where the best matches sort
+        for length in range(len(query), 0, -1):
+            start, end = self.prefix_range(query[:length])
+            if start < end:
+                break
+        first_chunk = (start - bucket_start) // self.FUZZY_CHUNK_SIZE
+        # Each character is found at its first occurrence after the previous one ([^\nc]*c), so no backtracking
+        pattern = re.compile("\n" + re.escape(first) + "".join(f"[^\n{re.escape(c)}]*{re.escape(c)}" for c in query[1:]))
+        deadline = time.perf_counter() + self.FUZZY_TIME_BUDGET
+        count = 0
+        for text, offset in chunks[first_chunk:] + chunks[:first_chunk]:
+            line_number = 0
+            position = 0
+            for match in pattern.finditer(text):
+                line_number += text.count("\n", position, match.start())
+                position = match.start()
+                yield self.names[offset + line_number]
+                count += 1
+                if count >= self.MAX_FUZZY_CANDIDATES:
+                    return
+            if time.perf_counter() > deadline:
+                return
+
+    def complete(self, text, usage=None, limit=50):
+        """
+        Returns up to limit names for text: prefix matches first, then fuzzy matches, each
+        ranked by usage count and recency (from usage, a name -> (count, last used) mapping)
+        and then alphabetically.
+        """
+        usage = usage or {}
+        def rank(name):
+            count, last_used = usage.get(name, (0, 0))
+            return (-count, -last_used, name.lower())
+
+        start, end = self.prefix_range(text)
+        # Frequently used names are always considered, even when the prefix range is huge
+        candidates = set(self.names[start:min(end, start + self.MAX_PREFIX_CANDIDATES)])
+        candidates.update(name for name in usage if name.lower().startswith(text.lower()) and name in self.name_set)
+        results = sorted(candidates, key=rank)[:limit]
+        if len(results) < limit and len(text) > 1:
+            seen = set(results)
+            fuzzy = [name for name in self.fuzzy_matches(text) if name not in seen]
+            results.extend(sorted(fuzzy, key=rank)[:limit - len(results)])
+        return results
+
+def get_alias_name_index(sources):
+    """Returns the completion index for the alias files, rebuilt only when one of them changes."""
+    merged = load_merged_index(sources)
+    if "name_index" not in merged:
+        with span("completion.build"):
+            merged["name_index"] = AliasNameIndex(merged["owners"])
+    return merged["name_index"]
+
+# Interactive state, built on first use by the getters below
+_history = None
+_key_bindings = None
+_alias_completer = None
+
+# Persistent history and usage statistics live here
+STATE_DIR = "~/.alias_manager"
+HISTORY_MAX_ENTRIES = 1000
+HISTORY_COMPACT_BYTES = 256 * 1024 # Compact the history file once it grows past this size
+
+def get_state_path(name):
+    """Returns the path of a file in the state directory, creating the directory if needed."""
+    state_dir = os.path.expanduser(STATE_DIR)
+    os.makedirs(state_dir, exist_ok=True)
+    return os.path.join(state_dir, name)
+
+def compact_history_file(history_path):
+    """Keeps only the newest HISTORY_MAX_ENTRIES entries of a prompt_toolkit FileHistory file."""
+    with alias_file_lock(history_path):
+        with open(history_path, "r") as f:
+            lines = f.readlines()
+        entry_starts = [i for i, line in enumerate(lines) if line.startswith("#")]
+        if len(entry_starts) > HISTORY_MAX_ENTRIES:
+            atomic_write_lines(history_path, lines[entry_starts[-HISTORY_MAX_ENTRIES]:])
+
+def get_history():
+    """
+    Returns the prompt history shared by every prompt, persisted across runs in the state directory.
+    prompt_toolkit only loads it when a prompt first needs it.
+    """
+    global _history
+    if _history is None:
+        from prompt_toolkit.history import FileHistory, InMemoryHistory
+
+        class BoundedFileHistory(FileHistory):
+            def store_string(self, string):
+                super().store_string(string)
+                if os.path.getsize(self.filename) > HISTORY_COMPACT_BYTES:
+                    compact_history_file(self.filename)
+
+        try:
+            _history = BoundedFileHistory(get_state_path("history"))
+        except OSError: # Read-only home directory; history lasts for this session only
+            _history = InMemoryHistory()
+    return _history
+
+# Incrementally loaded view of the usage log: name -> (use count, last used timestamp)
+_usage_table = {"inode": None, "offset": 0, "records": 0, "usage": {}}
 
+def load_usage_table():
+    """
+    Returns the usage table, reading only the records appended to the usage log since the last call.
+    The log holds one "name<TAB>count<TAB>timestamp" record per line and is summed on load.
+    """
+    try:
+        usage_path = get_state_path("usage")
+        st = os.stat(usage_path)
+    except OSError:
+        return _usage_table["usage"]
+    if st.st_ino != _usage_table["inode"] or st.st_size < _usage_table["offset"]:
+        # Compacted or replaced since we last read it
+        _usage_table.update(inode=st.st_ino, offset=0, records=0, usage={})
+    if st.st_size > _usage_table["offset"]:
+        with open(usage_path, "rb") as f:
+            f.seek(_usage_table["offset"])
+            data = f.read()
+        data = data[:data.rfind(b"\n") + 1] # A record still being written is read next time
+        usage = _usage_table["usage"]
+        for record in data.decode().splitlines():
+            fields = record.split("\t")
+            if len(fields) != 3 or not fields[1].isdigit() or not fields[2].isdigit():
+                continue
+            count, last_used = usage.get(fields[0], (0, 0))
+            usage[fields[0]] = (count + int(fields[1]), max(last_used, int(fields[2])))
+            _usage_table["records"] += 1
+        _usage_table["offset"] += len(data)
+    return _usage_table["usage"]
+
+def rewrite_usage_log(usage_path, usage):
+    """Replaces the usage log with one summed record per name in usage (the caller holds its lock)."""
+    atomic_write_lines(usage_path, [f"{name}\t{count}\t{last_used}\n" for name, (count, last_used) in usage.items()])
+    _usage_table.update(inode=os.stat(usage_path).st_ino, offset=os.path.getsize(usage_path),
+                        records=len(usage), usage=usage)
+
+def record_usage(names):
+    """
+    Appends a use of each name to the usage log. When the log is mostly redundant it is compacted,
+    dropping names that are no longer defined in any alias file.
+    """
+    if not names:
+        return
+    try:
+        usage_path = get_state_path("usage")
+        with alias_file_lock(usage_path):
+            now = int(time.time())
+            with open(usage_path, "a") as f:
+                f.write("".join(f"{name}\t1\t{now}\n" for name in names))
+            usage = load_usage_table()
+            if _usage_table["records"] > 2 * len(usage) + 256:
+                defined = load_merged_index(get_alias_sources())["owners"]
+                rewrite_usage_log(usage_path, {name: value for name, value in usage.items() if name in defined})
+    except OSError:
+        pass # Usage statistics are best effort
+
+def forget_usage(names):
+    """Removes deleted names from the usage log, so they no longer rank in completion or `ls --usage`."""
+    try:
+        usage_path = get_state_path("usage")
+        with alias_file_lock(usage_path):
+            usage = load_usage_table()
+            if any(name in usage for name in names):
+                rewrite_usage_log(usage_path, {name: value for name, value in usage.items() if name not in names})
+    except OSError:
+        pass # Usage statistics are best effort
+
+def get_key_bindings():
+    """Returns the key bindings shared by every prompt in this session."""
+    global _key_bindings
+    if _key_bindings is None:
+        from prompt_toolkit.key_binding import KeyBindings
+        from prompt_toolkit.keys import Keys
+        _key_bindings = KeyBindings()
+
+        @_key_bindings.add(Keys.ControlZ)
+        def _(event):
+            "Pressing Ctrl-Z will exit the tool."
+            sys.exit(0)
+    return _key_bindings
+
+def word_completer(words):
+    """Returns a case-insensitive completer over a fixed list of words."""
+    from prompt_toolkit.completion import WordCompleter
+    return WordCompleter(words, ignore_case=True)
+
+def get_alias_completer(sources):
+    """
+    Returns the alias name completer. It completes the name after the last comma using the
+    cached name index of the alias files, ranked by the usage table.
+    """
+    global _alias_completer
+    if _alias_completer is None:
+        from prompt_toolkit.completion import Completer, Completion
+
+        class AliasCompleter(Completer):
+            def __init__(self):
+                self.sources = None
+
+            def get_completions(self, document, complete_event):
+                word = document.text_before_cursor.rsplit(",", 1)[-1].lstrip()
+                if not word:
+                    return
+                with span("completion.query"):
+                    name_index = get_alias_name_index(self.sources)
+                    names = name_index.complete(word, load_usage_table())
+                for name in names:
+                    yield Completion(name, start_position=-len(word))
+
+        _alias_completer = AliasCompleter()
+    _alias_completer.sources = sources
+    get_alias_name_index(sources) # Build the index before the first keystroke
+    return _alias_completer
+
+@timed("prompt")
+def prompt(message, completer=None):
+    """Shows an interactive prompt with the shared history and key bindings."""
+    from prompt_toolkit import prompt as toolkit_prompt
+    return toolkit_prompt(message, history=get_history(), completer=completer, key_bindings=get_key_bindings())
+
+def page_output(lines, page_size=None):
+    """
+    Prints lines as they are produced, pausing after each screenful when stdout is a terminal.
+    Returns False if the user stopped the listing early.
+    """
+    if page_size is None:
+        import shutil
+        page_size = max(shutil.get_terminal_size().lines - 2, 5) if sys.stdout.isatty() else 0
+    iterator = iter(lines)
+    count = 0
+    line = next(iterator, None)
+    while line is not None:
+        print(line)
+        count += 1
+        line = next(iterator, None)
+        if line is not None and page_size and count % page_size == 0:
+            answer = prompt("-- More -- [Enter: next page, q: stop listing]: ")
+            if answer.strip().lower() == 'q':
+                return False
+    return True
+
+def iter_listing_lines(alias_file_path):
+    """Yields the numbered, non-empty lines of the alias file shown by the interactive listing."""
+    with open(alias_file_path, "r") as f:
+        non_empty_lines = (line.strip() for line in f if line.strip())
+        for display_count, stripped_line in enumerate(non_empty_lines, 1):
+            yield f"{display_count}: {stripped_line}"
+
+def get_alias_file_path():
+    """Returns the path of the alias file, honouring the Termux home directory."""
+    if platform.system() == "Linux" and os.path.exists("/data/data/com.termux"):
+        return "/data/data/com.termux/files/home/.bash_aliases"
+    return os.path.expanduser("~/.bash_aliases")
+
+def format_function_definition(alias_name, command):
+    """Returns the shell function the tool writes for an alias name and command."""
+    return f"""
+{alias_name}() {{
+  {command}
+}}"""
+
+@profiled_operation
 def create_and_activate_alias():
     """
     Prompts the user for a command and an alias name, then saves and activates the alias.
@@ -42,36 +1321,47 @@ def create_and_activate_alias():
     try:
         print() # Blank line before prompt
         while True:
-            command = prompt("Enter the command you want to alias: ", history=history, key_bindings=kb)
+            command = prompt("Enter the command you want to alias: ")
             if command.strip():
-                break
+                # Catch syntax errors before they land in the alias file and break shell startup
+                error = check_shell_syntax(format_function_definition("alias_manager_check", command))
+                if error is None:
+                    break
+                print(f"The command has a syntax error ({error}). Please try again...")
+                continue
             print("Input cannot be empty. Please try again...")
         print() # Blank line before prompt
         while True:
-            alias_name = prompt("Enter the alias name: ", history=history, key_bindings=kb)
-            if alias_name.strip():
-                break
+            alias_name = prompt("Enter the alias name: ").strip()
+            if alias_name:
+                if not NAME_PATTERN.match(alias_name):
+                    # Same rule as `add`; other names can't be found again to update, list or delete
+                    print(f"'{alias_name}' can't be used as an alias name (use letters, digits and underscores only). Please try again...")
+                    continue
+                # Define the function string
+                function_definition = format_function_definition(alias_name, command)
+                error = check_shell_syntax(function_definition)
+                if error is None:
+                    break
+                print(f"'{alias_name}' can't be used as an alias name ({error}). Please try again...")
+                continue
             print("Input cannot be empty. Please try again...")
 
-        # Define the function string
-        function_definition = f"""
-{alias_name}() {{
-  {command}
-}}"""
-
         # Path to the alias file (can be customized)
-        alias_file_path = os.path.expanduser("~/.bash_aliases")
-        if platform.system() == "Linux" and os.path.exists("/data/data/com.termux"):
-            alias_file_path = "/data/data/com.termux/files/home/.bash_aliases"
+        sources = get_alias_sources()
 
-        # Ensure the alias file exists
-        if not os.path.exists(alias_file_path):
-            open(alias_file_path, 'a').close() # Create the file if it doesn't exist
-
-        # Add the function to the file
-        with open(alias_file_path, "a") as f:
-            f.write(f"\n{function_definition}\n")
-        print(f"Alias '{alias_name}' for command '{command}' saved to {alias_file_path}")
+        # Replace an existing definition in place, or add the function to the alias file (created if it doesn't exist)
+        try:
+            replaced_names, changed_paths = upsert_aliases(sources, [(alias_name, function_definition)])
+        except UnterminatedDefinitionError as error:
+            print(f"\nAlias '{alias_name}' was not saved: {error}")
+            return False
+        alias_file_path = changed_paths[0]
+        if replaced_names:
+            print(f"Alias '{alias_name}' updated to command '{command}' in {alias_file_path}")
+        else:
+            print(f"Alias '{alias_name}' for command '{command}' saved to {alias_file_path}")
+        record_usage([alias_name])
 
         print(f"\n--------------------------------------------------------------------")
         print() # Blank line after separator
@@ -97,70 +1387,33 @@ def create_and_activate_alias():
         print() # Blank line before message
         return False # Interrupted
 
+@profiled_operation
 def manage_aliases():
-    alias_file_path = os.path.expanduser("~/.bash_aliases")
-    if platform.system() == "Linux" and os.path.exists("/data/data/com.termux"):
-        alias_file_path = "/data/data/com.termux/files/home/.bash_aliases"
+    sources = get_alias_sources()
+    alias_file_path = sources[0]
 
     try:
-        if not os.path.exists(alias_file_path) or os.stat(alias_file_path).st_size == 0:
+        non_empty_sources = [path for path in sources if os.path.exists(path) and os.stat(path).st_size > 0]
+        if not non_empty_sources:
             print(f"\nNo aliases or functions found in {alias_file_path}.")
             return False # Return False to continue to main menu
 
-        with open(alias_file_path, "r") as f:
-            lines = f.readlines()
-
-        # Initial alias listing
-        print(f"\n--- Current Aliases/Commands in {alias_file_path} ---")
-        display_count = 0 # New counter for displayed lines
-        for i, line in enumerate(lines):
-            stripped_line = line.strip()
-            if stripped_line: # Only process non-empty lines
-                display_count += 1
-
-                alias_match = re.match(r"^\s*alias\s+([a-zA-Z0-9_]+)=", stripped_line)
-                function_match = re.match(r"^\s*([a-zA-Z0-9_]+)\s*\(\)\s*\{", stripped_line)
-
-                if alias_match:
-                    print(f"{display_count}: {stripped_line}")
-                elif function_match:
-                    # The original formatting logic, now safely applied only to functions
-                    name = function_match.group(1)
-                    name_start_index = stripped_line.find(name)
-                    name_end_index = name_start_index + len(name)
-
-                    prefix = stripped_line[:name_start_index]
-                    suffix = stripped_line[name_end_index:]
-
-                    command_start_marker = "() {"
-                    command_start_index_in_suffix = suffix.find(command_start_marker)
-
-                    if command_start_index_in_suffix != -1:
-                        function_declaration_part = suffix[:command_start_index_in_suffix + len(command_start_marker)]
-                        command_part = suffix[command_start_index_in_suffix + len(command_start_marker):]
-
-                        formatted_line = (
-                            f"{display_count}: {prefix}"
-                            f"{name}"
-                            f"{function_declaration_part}"
-                            f"{command_part}"
-                        )
-                    else:
-                        formatted_line = (
-                            f"{display_count}: {prefix}"
-                            f"{name}"
-                            f"{suffix}"
-                        )
-                    print(formatted_line)
-                else:
-                    # For other lines like comments or lines inside a function
-                    print(f"{display_count}: {stripped_line}")
+        # Initial alias listing, streamed from each file one screenful at a time
+        for path in non_empty_sources:
+            print(f"\n--- Current Aliases/Commands in {path} ---")
+            if not page_output(iter_listing_lines(path)):
+                break
         print("----------------------------------------------------")
+        if len(sources) > 1:
+            merged = load_merged_index(sources)
+            shadowed = merged["shadowed"]
+            page_output(f"Note: '{name}' in {', '.join(shadowed[name])} is overridden by the definition in "
+                        f"{merged['owners'][name]}" for name in sorted(shadowed))
         try:
             print() # Blank line before prompt
 
             while True: # Loop for initial delete choice
-                delete_choice = prompt("Delete an alias/command? [y/N]: ", history=history, completer=WordCompleter(['y', 'n'], ignore_case=True), key_bindings=kb)
+                delete_choice = prompt("Delete an alias/command? [y/N]: ", completer=word_completer(['y', 'n']))
                 delete_choice_lower = delete_choice.lower()
                 if delete_choice_lower == 'y':
                     break # Exit the loop to proceed with deletion
@@ -172,25 +1425,24 @@ def manage_aliases():
 
             # Deletion loop
             while True: # Loop for deleting aliases until user says 'n'
-                # Update completer and get latest lines in each iteration
-                alias_completer.words = get_current_aliases()
-                with open(alias_file_path, "r") as f:
-                    lines = f.readlines()
+                # Refresh from the cached indexes; a file is only reparsed if it changed on disk
+                alias_completer = get_alias_completer(sources)
+                merged = load_merged_index(sources)
 
                 # If no lines left, exit deletion mode
-                if not lines or not any(line.strip() for line in lines):
+                if not any(line.strip() for index in merged["parts"] for line in index["lines"]):
                     print(f"\nNo aliases or functions left in {alias_file_path}.")
                     return False # Go to main menu
 
                 print() # Blank line before prompt
-                name_input = prompt("Enter the name(s) of the alias to delete (comma-separated for multiple, or 'all' to delete everything): ", history=history, completer=alias_completer, key_bindings=kb)
+                name_input = prompt("Enter the name(s) of the alias to delete (comma-separated for multiple, or 'all' to delete everything): ", completer=alias_completer)
 
                 if not name_input.strip():
                     print("Input cannot be empty. Please try again...")
                     continue
 
                 if name_input.strip().lower() == 'all':
-                    names_to_delete = get_current_aliases()
+                    names_to_delete = set(merged["owners"])
                 else:
                     names_to_delete = {name.strip() for name in name_input.split(',') if name.strip()}
 
@@ -199,38 +1451,15 @@ def manage_aliases():
                     continue
 
                 # --- DELETION LOGIC ---
-                to_delete_flags = [False] * len(lines)
-                deleted_names = set()
                 found_names = set()
-
-                for i, line in enumerate(lines):
-                    if to_delete_flags[i]:
-                        continue
-
-                    stripped_line = line.strip()
-
-                    alias_match = re.match(r"^\s*alias\s+([a-zA-Z0-9_]+)=", stripped_line)
-                    function_match = re.match(r"^\s*([a-zA-Z0-9_]+)\s*\(\)\s*\{", stripped_line)
-
-                    name_on_line = None
-                    if alias_match:
-                        name_on_line = alias_match.group(1)
-                    elif function_match:
-                        name_on_line = function_match.group(1)
-
-                    if name_on_line and name_on_line in names_to_delete:
-                        found_names.add(name_on_line)
-                        deleted_names.add(name_on_line)
-                        to_delete_flags[i] = True
-                        print(f"Marking for deletion: {stripped_line}")
-
-                        if function_match:
-                            # Mark all lines of the function for deletion
-                            closing_brace_pattern = re.compile(r"^\s*\}\s*(#.*)?$")
-                            for j in range(i + 1, len(lines)):
-                                to_delete_flags[j] = True
-                                if closing_brace_pattern.match(lines[j].strip()):
-                                    break
+                for path, index in merged["indexes"].items():
+                    # Only list what will go; remove_aliases_from_sources rewrites each file once after confirmation
+                    found_in_file = {name for name in names_to_delete if name in index["names"]}
+                    found_names |= found_in_file
+                    for position in sorted(position for name in found_in_file for position in index["names"][name]):
+                        entry = index["entries"][position]
+                        location = f" ({path})" if len(sources) > 1 else ""
+                        print(f"Marking for deletion: {index['lines'][entry['start']].strip()}{location}")
 
                 # --- END DELETION LOGIC ---
 
@@ -258,7 +1487,7 @@ def manage_aliases():
                         names_to_confirm = names_list[0] if names_list else ""
                     confirmation_prompt = f"Are you sure you want to delete {names_to_confirm}? [Y/n]: "
 
-                    confirm_delete = prompt(confirmation_prompt, history=history, completer=WordCompleter(['y', 'n'], ignore_case=True), key_bindings=kb)
+                    confirm_delete = prompt(confirmation_prompt, completer=word_completer(['y', 'n']))
                     confirm_delete_lower = confirm_delete.lower()
 
                     if confirm_delete_lower in ['y', 'n', '']:
@@ -271,21 +1500,28 @@ def manage_aliases():
                     continue # Go back to the top of the deletion loop to ask for names again
 
                 # --- ACTUAL DELETION ---
-                new_lines = [line for i, line in enumerate(lines) if not to_delete_flags[i]]
-                with open(alias_file_path, "w") as f:
-                    f.writelines(new_lines)
+                try:
+                    deleted_names, changed_paths = remove_aliases_from_sources(sources, found_names)
+                except UnterminatedDefinitionError as error:
+                    print(f"\nDeletion stopped: {error}")
+                    continue
+                if not deleted_names:
+                    print("\nThe selected aliases/functions were already removed from the file.")
+                    continue
                 print(f"\nSuccessfully deleted: {', '.join(sorted(list(deleted_names)))}")
+                forget_usage(deleted_names)
 
                 # If some names were not found, report them now
                 if not_found_names:
                     print(f"Note: The following input was not found: {', '.join(not_found_names)}")
 
-                print(f"Please run source {alias_file_path} to apply changes to your current session.")
+                for path in changed_paths:
+                    print(f"Please run source {path} to apply changes to your current session.")
                 print("\nNOTE: If you are running multiple shells (e.g., zsh and bash), you may need to run `source ~/.bash_aliases` in each shell to see updates. Alternatively, logging out and back in will apply the changes to all new terminal sessions.")
                 # Ask to continue
                 while True:
                     print()
-                    another_delete = prompt(f"Delete another? [y/N]: ", history=history, completer=WordCompleter(['y', 'n'], ignore_case=True), key_bindings=kb)
+                    another_delete = prompt(f"Delete another? [y/N]: ", completer=word_completer(['y', 'n']))
                     another_delete_lower = another_delete.lower()
                     if another_delete_lower in ['y', 'n', '']:
                         break
@@ -304,7 +1540,334 @@ def manage_aliases():
         print() # Blank line before message
         return False # Return False to indicate interruption
     return False # Return to the main menu after deletion loop finishes
+
+NAME_PATTERN = re.compile(r"^[a-zA-Z0-9_]+$")
+
+def read_input_lines(source):
+    """Returns the lines of a file, or of stdin when source is '-'."""
+    if source == "-":
+        return sys.stdin.read().splitlines(keepends=True)
+    with open(source, "r") as f:
+        return f.readlines()
+
+def parse_alias_pairs(lines):
+    """
+    Parses 'name=command' lines (blank lines and # comments are skipped).
+    Returns a list of (name, command) pairs and a list of error messages.
+    """
+    pairs = []
+    errors = []
+    for line_number, line in enumerate(lines, 1):
+        stripped_line = line.strip()
+        if not stripped_line or stripped_line.startswith("#"):
+            continue
+        name, separator, command = stripped_line.partition("=")
+        name = name.strip()
+        command = command.strip()
+        if not separator or not NAME_PATTERN.match(name) or not command:
+            errors.append(f"line {line_number}: expected 'name=command', got: {stripped_line}")
+            continue
+        pairs.append((name, command))
+    return pairs, errors
+
+def cli_add(args, alias_file_path):
+    """Handles `add`: adds or updates aliases given as arguments or as 'name=command' lines."""
+    if args.file:
+        pairs, errors = parse_alias_pairs(read_input_lines(args.file))
+    elif args.name and args.command:
+        pairs, errors = [], []
+        if NAME_PATTERN.match(args.name):
+            pairs.append((args.name, " ".join(args.command)))
+        else:
+            errors.append(f"invalid alias name: {args.name}")
+    else:
+        print("add: give NAME COMMAND..., or --file FILE ('-' for stdin)", file=sys.stderr)
+        return 2
+    for error in errors:
+        print(f"add: {error}", file=sys.stderr)
+    additions = [(name, format_function_definition(name, command)) for name, command in pairs]
+    additions, invalid = validate_additions(additions, args)
+    if additions:
+        report_upsert(upsert_aliases(get_alias_sources(alias_file_path, args.source), additions), additions)
+    return 1 if errors or invalid else 0
+
+def validate_additions(additions, args):
+    """Drops and reports additions that fail `bash -n`, unless --no-validate was given. Returns (valid additions, invalid count)."""
+    if args.no_validate or not additions:
+        return additions, 0
+    errors = validate_definitions(additions, timeout=args.validate_timeout)
+    if errors is None:
+        print("warning: bash not found; definitions were not syntax-checked", file=sys.stderr)
+        return additions, 0
+    for name in sorted(errors):
+        print(f"invalid definition for '{name}' (skipped): {errors[name]}", file=sys.stderr)
+    return [(name, definition) for name, definition in additions if name not in errors], len(errors)
+
+def report_upsert(result, additions):
+    """Prints how many of the upserted names were added and how many replaced existing definitions."""
+    replaced_names, changed_paths = result
+    added_count = len({name for name, _ in additions} - replaced_names)
+    print(f"Added {added_count} and updated {len(replaced_names)} alias(es)/function(s) in {', '.join(changed_paths)}")
+    for path in changed_paths:
+        print(f"Please run source {path} to apply changes to your current session.")
+
+def cli_import(args, alias_file_path):
+    """Handles `import`: copies alias/function definitions from another shell file."""
+    lines = read_input_lines(args.file)
+    entries, names = parse_alias_lines(lines)
+    # Only the last definition of each name in the input is imported
+    additions = [(entry["name"], "".join(lines[entry["start"]:entry["end"] + 1]).rstrip("\n"))
+                 for position, entry in enumerate(entries) if names[entry["name"]][-1] == position]
+    if not additions:
+        print(f"import: no aliases or functions found in {args.file}", file=sys.stderr)
+        return 1
+    additions, invalid = validate_additions(additions, args)
+    if additions:
+        report_upsert(upsert_aliases(get_alias_sources(alias_file_path, args.source), additions), additions)
+    return 1 if invalid else 0
+
+def cli_rm(args, alias_file_path):
+    """Handles `rm`: deletes the named aliases/functions in a single rewrite."""
+    sources = get_alias_sources(alias_file_path, args.source)
+    if args.all:
+        names = set(load_merged_index(sources)["owners"])
+    else:
+        names = set(args.names)
+        if args.file:
+            names.update(line.strip() for line in read_input_lines(args.file)
+                         if line.strip() and not line.strip().startswith("#"))
+    if not names:
+        print("rm: give NAME..., --file FILE ('-' for stdin) or --all", file=sys.stderr)
+        return 2
+    found_names, changed_paths = remove_aliases_from_sources(sources, names)
+    forget_usage(found_names)
+    not_found_names = names - found_names
+    if found_names:
+        print(f"Deleted {len(found_names)} alias(es)/function(s) from {', '.join(changed_paths)}")
+    if not_found_names:
+        print(f"rm: not found: {', '.join(sorted(not_found_names))}", file=sys.stderr)
+    return 1 if not_found_names else 0
+
+def cli_ls(args, alias_file_path):
+    """Handles `ls`: streams alias/function names in file order, or full definitions with --long."""
+    sources = get_alias_sources(alias_file_path, args.source)
+    entries = stream_alias_entries(sources, prefix=args.prefix, offset=args.offset, limit=args.limit)
+    if args.long:
+        output_lines = ("".join(span_lines).rstrip("\n") for _, _, span_lines in entries)
+    else:
+        usage = load_usage_table() if args.usage else None
+        owners = load_merged_index(sources)["owners"] if args.where else None
+
+        def format_entry(path, entry):
+            columns = [entry["name"]]
+            if usage is not None:
+                columns.append(str(usage.get(entry["name"], (0, 0))[0]))
+            if owners is not None:
+                columns.append(path)
+                if owners[entry["name"]] != path:
+                    columns.append(f"shadowed by {owners[entry['name']]}")
+            return "\t".join(columns)
+
+        output_lines = (format_entry(path, entry) for path, entry, _ in entries)
+    try:
+        page_output(output_lines, page_size=None if args.page else 0)
+    except KeyboardInterrupt:
+        print()
+    except BrokenPipeError: # Output piped into e.g. `head`; stop quietly
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    return 0
+
+def cli_compile(args, alias_file_path):
+    """Handles `compile`: writes the deduplicated, normalized snippet for the alias file."""
+    if not os.path.exists(alias_file_path):
+        print(f"compile: {alias_file_path} does not exist", file=sys.stderr)
+        return 1
+    try:
+        output_path, rewritten = compile_alias_file(alias_file_path, force=args.force)
+    except CompiledSyntaxError as error:
+        print(f"compile: {error}", file=sys.stderr)
+        return 1
+    if rewritten:
+        print(f"Compiled {alias_file_path} to {output_path}")
+    else:
+        print(f"{output_path} is up to date")
+    print(f"Source {output_path} instead of {alias_file_path} from your ~/.bashrc and ~/.zshrc.")
+    print("It is regenerated whenever this tool (or `watch`) sees the alias file change; these lines")
+    print("fall back to the alias file itself if it was edited since the snippet was compiled:")
+    print()
+    sys.stdout.write(compiled_source_snippet(alias_file_path))
+    return 0
+
+def cli_compact(args, alias_file_path):
+    """Handles `compact`: drops duplicate and shadowed definitions, keeping the effective ones."""
+    report = compact_alias_sources(get_alias_sources(alias_file_path, args.source), dry_run=args.dry_run)
+    if not report:
+        print("No duplicate or shadowed definitions found.")
+        return 0
+    verb = "Would remove" if args.dry_run else "Removed"
+    for path, removed, lines_saved, bytes_saved in report:
+        print(f"{verb} {removed} dead definition(s) from {path}: {lines_saved} lines, {bytes_saved} bytes")
+    total_lines = sum(lines_saved for _, _, lines_saved, _ in report)
+    total_bytes = sum(bytes_saved for _, _, _, bytes_saved in report)
+    print(f"Total: {total_lines} lines, {total_bytes} bytes")
+    return 0
+
+def cli_watch(args, alias_file_path):
+    """Handles `watch`: writes a delta file for live shells whenever the alias files change."""
+    print(f"Watching {', '.join(get_alias_sources(alias_file_path, args.source))} (Ctrl+C to stop)", flush=True)
+    try:
+        watch_alias_sources(alias_file_path, args.source, poll_interval=args.poll)
+    except KeyboardInterrupt:
+        print()
+    return 0
+
+def cli_hook(args, alias_file_path):
+    """Handles `hook`: prints the shell code that applies delta files before each prompt."""
+    sys.stdout.write(shell_hook_snippet(get_alias_sources(alias_file_path, args.source)))
+    return 0
+
+def measure_import_time():
+    """
+    Imports this module in a fresh interpreter under `python -X importtime`.
+    Returns (cumulative import time in ms, whether prompt_toolkit was imported).
+    """
+    import subprocess
+    module_dir = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import alias_manager"],
+                            cwd=module_dir, capture_output=True, text=True, check=True)
+    cumulative_us = 0
+    loaded_prompt_toolkit = False
+    for line in result.stderr.splitlines():
+        fields = [field.strip() for field in line[len("import time:"):].split("|")]
+        if len(fields) != 3 or not fields[1].isdigit():
+            continue # Header line
+        if fields[2] == "alias_manager":
+            cumulative_us = int(fields[1]) # Includes everything the module imports itself
+        loaded_prompt_toolkit = loaded_prompt_toolkit or fields[2] == "prompt_toolkit"
+    return cumulative_us / 1000, loaded_prompt_toolkit
+
+def cli_startup(args, alias_file_path):
+    """Handles `startup`: checks the module's import time against the startup budget."""
+    elapsed_ms, loaded_prompt_toolkit = measure_import_time()
+    print(f"Import time: {elapsed_ms:.1f} ms (budget {args.budget_ms} ms)")
+    if loaded_prompt_toolkit:
+        print("startup: prompt_toolkit is imported at startup", file=sys.stderr)
+    if elapsed_ms > args.budget_ms:
+        print("startup: import time is over budget", file=sys.stderr)
+    return 1 if loaded_prompt_toolkit or elapsed_ms > args.budget_ms else 0
+
+def non_negative_int(value):
+    """argparse type for counts such as --offset and --limit."""
+    import argparse
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: {value!r}")
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"must be 0 or more, got {number}")
+    return number
+
+def add_validation_arguments(parser):
+    """Adds the options controlling `bash -n` checks of new definitions."""
+    parser.add_argument("--no-validate", action="store_true", help="write definitions without checking them with bash -n")
+    parser.add_argument("--validate-timeout", type=float, default=VALIDATION_TIMEOUT,
+                        help=f"seconds allowed per bash -n run (default: {VALIDATION_TIMEOUT})")
+
+def build_cli_parser():
+    """Returns the argument parser for the non-interactive subcommands."""
+    import argparse
+    parser = argparse.ArgumentParser(prog="alias_manager.py",
+                                     description="Manage ~/.bash_aliases. Run without a subcommand for the interactive menu.")
+    parser.add_argument("--alias-file", help="alias file to operate on (default: ~/.bash_aliases)")
+    parser.add_argument("--source", action="append",
+                        help="extra alias files (glob) read after the alias file; repeatable "
+                             "(default: $ALIAS_MANAGER_SOURCES, or ~/.bash_aliases.d/*.sh unless --alias-file is given)")
+    parser.add_argument("--profile", action="store_true",
+                        help="time reading, parsing, indexing, completion and writes, and print a per-span summary "
+                             "(also enabled by ALIAS_MANAGER_PROFILE=1)")
+    parser.add_argument("--profile-output", metavar="FILE", help="also save a cProfile/pstats dump of the run to FILE")
+    subparsers = parser.add_subparsers(dest="subcommand")
+
+    add_parser = subparsers.add_parser("add", help="add aliases from arguments or from 'name=command' lines")
+    add_parser.add_argument("name", nargs="?")
+    add_parser.add_argument("command", nargs=argparse.REMAINDER)
+    add_parser.add_argument("-f", "--file", help="read 'name=command' lines from FILE ('-' for stdin)")
+    add_validation_arguments(add_parser)
+    add_parser.set_defaults(handler=cli_add)
+
+    import_parser = subparsers.add_parser("import", help="import alias/function definitions from a shell file")
+    import_parser.add_argument("file", help="shell file to import ('-' for stdin)")
+    add_validation_arguments(import_parser)
+    import_parser.set_defaults(handler=cli_import)
+
+    rm_parser = subparsers.add_parser("rm", help="delete aliases/functions by name")
+    rm_parser.add_argument("names", nargs="*")
+    rm_parser.add_argument("-f", "--file", help="read names, one per line, from FILE ('-' for stdin)")
+    rm_parser.add_argument("--all", action="store_true", help="delete every alias and function")
+    rm_parser.set_defaults(handler=cli_rm)
+
+    ls_parser = subparsers.add_parser("ls", help="list alias/function names in file order")
+    ls_parser.add_argument("-l", "--long", action="store_true", help="print full definitions")
+    ls_parser.add_argument("--where", action="store_true", help="print the file defining each name and flag shadowed definitions")
+    ls_parser.add_argument("--usage", action="store_true", help="print how often each name was used in the interactive menu")
+    ls_parser.add_argument("--prefix", help="only list names starting with PREFIX")
+    ls_parser.add_argument("--offset", type=non_negative_int, default=0, help="skip the first OFFSET matches")
+    ls_parser.add_argument("--limit", type=non_negative_int, help="list at most LIMIT matches")
+    ls_parser.add_argument("--page", action="store_true", help="pause after each screenful when writing to a terminal")
+    ls_parser.set_defaults(handler=cli_ls)
+
+    compact_parser = subparsers.add_parser("compact", help="remove duplicate and shadowed definitions, keeping the effective ones")
+    compact_parser.add_argument("--dry-run", action="store_true", help="report what would be removed without writing")
+    compact_parser.set_defaults(handler=cli_compact)
+
+    compile_parser = subparsers.add_parser("compile", help="write a deduplicated, normalized copy of the alias file for fast sourcing")
+    compile_parser.add_argument("--force", action="store_true", help="regenerate even if the source is unchanged")
+    compile_parser.set_defaults(handler=cli_compile)
+
+    watch_parser = subparsers.add_parser("watch", help="write a small delta file whenever the alias files change")
+    watch_parser.add_argument("--poll", type=float, default=2.0,
+                              help="seconds between checks when inotify is unavailable (default: 2)")
+    watch_parser.set_defaults(handler=cli_watch)
+
+    hook_parser = subparsers.add_parser("hook", help="print the bash/zsh prompt hook that applies delta files")
+    hook_parser.set_defaults(handler=cli_hook)
+
+    startup_parser = subparsers.add_parser("startup", help="check import time with python -X importtime")
+    startup_parser.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS,
+                                help=f"fail if importing takes longer (default: {STARTUP_BUDGET_MS})")
+    startup_parser.set_defaults(handler=cli_startup)
+    return parser
+
+def run_cli(argv):
+    """
+    Applies the global options and runs a non-interactive subcommand, returning its exit status.
+    Returns None when no subcommand was given, so the interactive menu runs instead.
+    """
+    parser = build_cli_parser()
+    args = parser.parse_args(argv)
+    if args.profile or args.profile_output:
+        enable_profiling(args.profile_output)
+    if args.subcommand is None:
+        if args.alias_file or args.source:
+            parser.error("--alias-file and --source need a subcommand")
+        return None
+    alias_file_path = os.path.expanduser(args.alias_file) if args.alias_file else get_alias_file_path()
+    if args.alias_file and args.source is None and not os.environ.get("ALIAS_MANAGER_SOURCES"):
+        args.source = [] # An explicit --alias-file means that file alone, not the default extra files
+    try:
+        return args.handler(args, alias_file_path)
+    except UnterminatedDefinitionError as error:
+        print(f"{args.subcommand}: {error}", file=sys.stderr)
+        return 1
+
+if os.environ.get("ALIAS_MANAGER_PROFILE", "").strip().lower() not in ("", "0", "false", "no", "off"):
+    enable_profiling(os.environ.get("ALIAS_MANAGER_PROFILE_OUTPUT"))
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        status = run_cli(sys.argv[1:])
+        if status is not None:
+            sys.exit(status)
     try:
         error_message = "" # Initialize error_message outside the loop
         at_main_menu_prompt = True # Flag to track if we are at the main menu prompt
@@ -344,11 +1907,11 @@ if __name__ == "__main__":
             print() # Blank line before prompt
 
             at_main_menu_prompt = True # We are at the main menu prompt
-            menu_completer = WordCompleter(['1', '2', '3'], ignore_case=True)
+            menu_completer = word_completer(['1', '2', '3'])
 
             while True: # Inner loop for input validation
                 prompt_to_display = "Enter your choice [1-3]: "
-                choice = prompt(prompt_to_display, history=history, completer=menu_completer, key_bindings=kb)
+                choice = prompt(prompt_to_display, completer=menu_completer)
                 if choice.strip():
                     break
                 print("Input cannot be empty. Please try again...")
@@ -368,7 +1931,7 @@ if __name__ == "__main__":
                             print(error_message) # Print error message from previous iteration
                             error_message = "" # Clear error message after printing
                         try:
-                            another_create = prompt(prompt_text, history=history, completer=WordCompleter(['y', 'n'], ignore_case=True), key_bindings=kb)
+                            another_create = prompt(prompt_text, completer=word_completer(['y', 'n']))
                             another_create_lower = another_create.lower()
                         except KeyboardInterrupt:
                             print() # Blank line before message
@@ -396,9 +1959,7 @@ if __name__ == "__main__":
             elif choice == '3':
                 print() # Blank line before message
                 # Determine the correct bash_aliases path based on OS
-                bash_aliases_path = os.path.expanduser("~/.bash_aliases")
-                if platform.system() == "Linux" and os.path.exists("/data/data/com.termux"):
-                    bash_aliases_path = "/data/data/com.termux/files/home/.bash_aliases"
+                bash_aliases_path = get_alias_file_path()
 
                 print(f"\nTo make the alias permanent for future sessions, ensure that your ~/.bashrc and ~/.zshrc files source ~/.bash_aliases.")
                 print(f"You can add the following lines to your ~/.bashrc and ~/.zshrc files if they are not already there:")
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Benchmarks alias_manager.py on synthetic alias files.
+
+Generates ~/.bash_aliases-style files with 100 to 100k entries (alias lines, multi-line
+and one-line functions, comments and blank lines), then times parsing, the interactive
+listing, completer queries and multi-name deletion. Results are written as JSON so runs
+from different versions can be compared:
+
+    python3 benchmark.py --output before.json
+    python3 benchmark.py --output after.json --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import alias_manager
+
+DEFAULT_SIZES = [100, 1000, 10000, 100000]
+COMPLETION_QUERIES = ["a", "g", "gi", "git", "dk", "ls_", "zzz", "fnc"]
+WORDS = ["git", "ls", "docker", "kube", "npm", "make", "ssh", "grep", "find", "tar", "cd", "py"]
+
+def generate_alias_file(path, size, seed=0):
+    """Writes a synthetic alias file with size entries and returns their names."""
+    rng = random.Random(seed)
+    names = []
+    with open(path, "w") as f:
+        for i in range(size):
+            name = f"{rng.choice(WORDS)}_{rng.choice(WORDS)}{i}"
+            names.append(name)
+            kind = rng.random()
+            if kind < 0.5:
+                f.write(f"alias {name}='{rng.choice(WORDS)} --flag {i}'\n")
+            elif kind < 0.6:
+                f.write(f"{name}() {{ {rng.choice(WORDS)} -v; }}\n")
+            elif kind < 0.85:
+                f.write(f"\n{name}() {{\n  {rng.choice(WORDS)} \"$@\"\n}}\n")
+            else:
+                f.write(f"{name}() {{\n  if [ -n \"$1\" ]; then\n    {{ echo \"${{1}}\"; }}\n  fi\n}}\n")
+            if rng.random() < 0.15:
+                f.write(f"# {rng.choice(WORDS)} helpers\n")
+    return names
+
+def measure(operation, repeat):
+    """Returns (best wall time in seconds, peak traced memory in bytes) for operation()."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        operation()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start() # Separate run, since tracing slows the timed ones down
+    operation()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+def benchmark_size(directory, size, repeat):
+    """Runs every benchmark on one synthetic file and returns the result records."""
+    path = os.path.join(directory, f"aliases_{size}")
+    names = generate_alias_file(path, size)
+    delete_names = set(random.Random(size).sample(names, max(1, size // 10)))
+    queries = COMPLETION_QUERIES * 10
+
+    def parse():
+        alias_manager._alias_index_cache.clear()
+        alias_manager.get_current_aliases(path)
+
+    def listing():
+        for _ in alias_manager.iter_listing_lines(path):
+            pass
+
+    def complete():
+        name_index = alias_manager.get_alias_name_index([path])
+        for query in queries:
+            name_index.complete(query)
+
+    def delete():
+        copy_path = path + ".delete"
+        shutil.copyfile(path, copy_path)
+        alias_manager.remove_aliases(copy_path, delete_names)
+
+    operations = [
+        ("parse", parse, size),
+        ("list", listing, size),
+        ("complete", complete, len(queries)),
+        ("delete", delete, len(delete_names)),
+    ]
+    results = []
+    alias_manager.get_current_aliases(path) # Warm the cache the completer reads from
+    for operation_name, operation, items in operations:
+        seconds, peak_bytes = measure(operation, repeat)
+        results.append({
+            "size": size,
+            "operation": operation_name,
+            "items": items,
+            "seconds": seconds,
+            "items_per_second": items / seconds if seconds else None,
+            "peak_bytes": peak_bytes,
+        })
+        print(f"{size:>7} {operation_name:<9} {seconds * 1000:10.2f} ms {items / seconds if seconds else 0:14.0f} items/s "
+              f"{peak_bytes / 1024:10.0f} KiB peak")
+    return results
+
+def compare(results, baseline_path, threshold):
+    """Prints time ratios against a previous run and returns the number of regressions."""
+    with open(baseline_path, "r") as f:
+        baseline = {(r["size"], r["operation"]): r for r in json.load(f)["results"]}
+    regressions = 0
+    print(f"\nCompared with {baseline_path} (regression threshold {threshold:.0%}):")
+    for result in results:
+        previous = baseline.get((result["size"], result["operation"]))
+        if previous is None or not previous["seconds"]:
+            continue
+        ratio = result["seconds"] / previous["seconds"]
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{result['size']:>7} {result['operation']:<9} {ratio:6.2f}x time{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="entries per synthetic file")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per operation; the best is kept")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="compare against a previous JSON result file")
+    parser.add_argument("--threshold", type=float, default=0.10, help="slowdown ratio reported as a regression")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="alias_benchmark_")
+    try:
+        results = []
+        for size in args.sizes:
+            results.extend(benchmark_size(directory, size, args.repeat))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    if args.compare:
+        return 1 if compare(results, args.compare, args.threshold) else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
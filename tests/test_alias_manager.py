@@ -0,0 +1,166 @@
+import shutil
+
+import pytest
+
+import alias_manager
+
+
+def parse(text):
+    lines = text.splitlines(keepends=True)
+    entries, _ = alias_manager.parse_alias_lines(lines)
+    return lines, {entry["name"]: entry for entry in entries}
+
+
+def write(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+
+def test_one_line_and_nested_functions():
+    lines, entries = parse(
+        "a() { echo a; }\n"
+        "b() {\n"
+        "  if true; then { echo \"}\"; }; fi\n"
+        "  echo ${HOME}\n"
+        "}\n"
+        "alias c='ls'\n"
+    )
+    assert (entries["a"]["start"], entries["a"]["end"]) == (0, 0)
+    assert entries["a"]["body"] == "echo a"
+    assert (entries["b"]["start"], entries["b"]["end"]) == (1, 4)
+    assert entries["c"]["kind"] == "alias"
+
+
+def test_dollar_single_quote_with_escaped_quote():
+    _, entries = parse("f() {\n  echo $'it\\'s }'\n}\nalias z=y\n")
+    assert entries["f"]["end"] == 2
+    assert "unterminated" not in entries["f"]
+    assert entries["z"]["start"] == 3
+
+
+def test_heredoc_body_is_skipped():
+    _, entries = parse(
+        "f() {\n"
+        "  cat <<'EOF'\n"
+        "}\n"
+        "EOF\n"
+        "  cat <<-END\n"
+        "\t{\n"
+        "\tEND\n"
+        "}\n"
+        "g() { echo $((1<<2)); }\n"
+    )
+    assert entries["f"]["end"] == 7
+    assert (entries["g"]["start"], entries["g"]["end"]) == (8, 8)
+
+
+def test_delete_refuses_unterminated_function(tmp_path):
+    path = write(tmp_path, "aliases", "alias a=b\nf() {\n  echo \"oops\n}\nalias z=y\n")
+    with pytest.raises(alias_manager.UnterminatedDefinitionError):
+        alias_manager.remove_aliases(path, {"f"})
+    assert (tmp_path / "aliases").read_text().endswith("alias z=y\n")
+    assert alias_manager.remove_aliases(path, {"a"})[0] == {"a"}
+
+
+def test_splice_drops_and_replaces_entries():
+    lines, _ = parse("alias a=1\n\nb() {\n  echo b\n}\nalias c=3\n")
+    index = {"path": "aliases", "lines": lines}
+    index["entries"], index["names"] = alias_manager.parse_alias_lines(lines)
+    new_lines, new_entries = alias_manager.splice_alias_entries(
+        index, {index["names"]["b"][0]}, {index["names"]["a"][0]: ["alias a=2\n"]}, ["alias d=4\n"])
+    assert "".join(new_lines) == "alias a=2\nalias c=3\nalias d=4\n"
+    assert [(entry["name"], entry["start"]) for entry in new_entries] == [("a", 0), ("c", 1), ("d", 2)]
+
+
+def test_compact_keeps_effective_definitions(tmp_path):
+    first = write(tmp_path, "aliases", "alias a=1\nalias b=1\nalias a=2\n")
+    second = write(tmp_path, "team.sh", "alias b=2\n")
+    report = alias_manager.compact_alias_sources([first, second])
+    assert [(path, removed) for path, removed, _, _ in report] == [(first, 2)]
+    assert (tmp_path / "aliases").read_text() == "alias a=2\n"
+    assert (tmp_path / "team.sh").read_text() == "alias b=2\n"
+
+
+def test_compile_keeps_comment_lines_inside_strings():
+    lines, _ = parse('export FOO="bar\n# not a comment"\n# comment\n\nalias a=b\n')
+    entries, names = alias_manager.parse_alias_lines(lines)
+    compiled = alias_manager.compile_alias_lines(lines, entries, names)
+    assert "".join(compiled) == 'export FOO="bar\n# not a comment"\nalias a=b\n'
+
+
+def test_fuzzy_completion_finds_matches_beyond_the_first_chunk(monkeypatch):
+    monkeypatch.setattr(alias_manager.AliasNameIndex, "FUZZY_CHUNK_SIZE", 2)
+    monkeypatch.setattr(alias_manager.AliasNameIndex, "FUZZY_TIME_BUDGET", 60)
+    names = [f"grep_{i:02}" for i in range(20)] + ["grep_make_1", "grep_make_2", "gz_m_4"]
+    name_index = alias_manager.AliasNameIndex(names)
+    assert name_index.complete("grpmk") == ["grep_make_1", "grep_make_2"]
+    assert name_index.complete("g_m_4") == ["gz_m_4"]
+    assert name_index.complete("gzq") == []
+
+
+def test_upsert_collapses_repeated_new_names(tmp_path):
+    path = write(tmp_path, "aliases", "")
+    alias_manager.upsert_aliases([path], [("x", "alias x=a"), ("x", "alias x=b"), ("y", "alias y=c")])
+    assert (tmp_path / "aliases").read_text() == "\nalias x=b\n\nalias y=c\n"
+
+
+def test_index_cache_reloads_after_outside_edit(tmp_path):
+    path = write(tmp_path, "aliases", "alias a=1\n")
+    first = alias_manager.load_alias_index(path)
+    assert alias_manager.load_alias_index(path) is first
+    (tmp_path / "aliases").write_text("alias a=1\nalias b=2\n")
+    second = alias_manager.load_alias_index(path)
+    assert second is not first
+    assert set(second["names"]) == {"a", "b"}
+
+
+def test_stream_entries_with_prefix_offset_and_limit(tmp_path):
+    first = write(tmp_path, "aliases", "alias ga=1\nalias b=1\ngb() {\n  echo\n}\n")
+    second = write(tmp_path, "team.sh", "alias gc=1\nalias gd=1\n")
+
+    def names(**kwargs):
+        return [(path, entry["name"]) for path, entry, _ in alias_manager.stream_alias_entries([first, second], **kwargs)]
+
+    assert names(prefix="g") == [(first, "ga"), (first, "gb"), (second, "gc"), (second, "gd")]
+    assert names(prefix="g", offset=1, limit=2) == [(first, "gb"), (second, "gc")]
+    assert names(offset=4) == [(second, "gd")]
+    assert names(limit=0) == []
+
+
+def test_usage_of_deleted_names_is_forgotten(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setattr(alias_manager, "_usage_table", {"inode": None, "offset": 0, "records": 0, "usage": {}})
+    alias_manager.record_usage(["a", "b", "a"])
+    assert alias_manager.load_usage_table()["a"][0] == 2
+    alias_manager.forget_usage({"a"})
+    assert set(alias_manager.load_usage_table()) == {"b"}
+
+
+def test_alias_delta_covers_changed_removed_and_other_code(tmp_path):
+    first = write(tmp_path, "aliases", "alias a=1\nalias b=1\nexport X=1\n")
+    second = write(tmp_path, "team.sh", "alias c=1\nalias d=1\n")
+    old = alias_manager.snapshot_alias_sources([first, second])
+    assert alias_manager.build_alias_delta(old, old) == ""
+    (tmp_path / "aliases").write_text("alias a=2\nexport X=2\n")
+    (tmp_path / "team.sh").write_text("alias c=1\nalias b=3\n")
+    delta = alias_manager.build_alias_delta(old, alias_manager.snapshot_alias_sources([first, second]))
+    assert "alias a=2\n" in delta
+    assert "alias b=3\n" in delta
+    assert "alias c=" not in delta
+    assert "unalias d 2>/dev/null; unset -f d 2>/dev/null\n" in delta
+    assert f". {first}\n" in delta
+    assert f". {second}\n" not in delta
+
+
+@pytest.mark.skipif(shutil.which("bash") is None, reason="needs bash")
+def test_validate_definitions_falls_back_to_single_checks():
+    definitions = [
+        ("a", "alias a='ls'"),
+        ("b", "b() {\n  echo 'x\n}"), # Together with c's stray quote, the batch still passes bash -n
+        ("c", "c() {\n  echo y'\n}"),
+        ("d", "alias d='pwd'"),
+    ]
+    errors = alias_manager.validate_definitions(definitions, batch_size=4)
+    assert set(errors) == {"b", "c"}
+    assert alias_manager.validate_definitions(definitions[:1] + definitions[3:], batch_size=4) == {}